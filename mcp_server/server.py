@@ -1,11 +1,234 @@
 from flask import Flask, request, jsonify
 import pandas as pd
+import numpy as np
 import json
 import os
+import threading
 from datetime import datetime
+from functools import wraps
 
 app = Flask(__name__)
 
+# --- Load-time Indexes ---
+# Structures built once from the loaded data and kept up to date as new transactions arrive.
+
+def _summarize_merchant_activity(txns: pd.DataFrame) -> pd.DataFrame:
+    """Per-merchant transaction count and first/last timestamp."""
+    return txns.groupby('merchant_id')['timestamp'].agg(txn_count='size', first_seen='min', last_seen='max')
+
+
+def _merchant_txn_rates() -> pd.Series:
+    """Baseline activity per merchant: transactions per second over the merchant's own active span.
+
+    Merchants whose transactions all share one timestamp have no measurable rate (NaN).
+    """
+    span_seconds = (merchant_activity['last_seen'] - merchant_activity['first_seen']).dt.total_seconds()
+    return merchant_activity['txn_count'] / span_seconds.where(span_seconds > 0)
+
+
+def _encode_ids(values, codes: dict, names: list) -> np.ndarray:
+    """Maps ids to dense integer codes, registering unseen ids.
+
+    Only the batch's distinct values touch the dict, so the cost is O(batch) however many ids are known.
+    """
+    batch_codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    lookup = np.empty(len(uniques), dtype=np.int64)
+    for i, name in enumerate(uniques):
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(names)
+            names.append(name)
+        lookup[i] = code
+    return lookup[batch_codes]
+
+
+class CardMerchantIndex:
+    """Bipartite card <-> merchant index with per-edge transaction counts.
+
+    Both directions are stored CSR-style (indptr / neighbour / count arrays), so looking up a
+    node's neighbours is an array slice. New transactions go into a small per-node delta that
+    queries merge on the fly; the delta is folded into the CSR arrays once it reaches
+    compact_every edges.
+    """
+
+    def __init__(self, card_ids, merchant_ids, compact_every: int = 10000):
+        self.compact_every = compact_every
+        self.card_codes, self.card_names = {}, []
+        self.merchant_codes, self.merchant_names = {}, []
+        cards = _encode_ids(card_ids, self.card_codes, self.card_names)
+        merchants = _encode_ids(merchant_ids, self.merchant_codes, self.merchant_names)
+        self._build(cards, merchants, np.ones(len(cards), dtype=np.int64))
+
+    def _build(self, cards: np.ndarray, merchants: np.ndarray, counts: np.ndarray):
+        n_cards, n_merchants = len(self.card_names), len(self.merchant_names)
+        # One key per (card, merchant) edge; np.unique sorts them card-major, which is the card CSR order
+        edge_keys, inverse = np.unique(cards * max(n_merchants, 1) + merchants, return_inverse=True)
+        edge_counts = np.bincount(inverse, weights=counts, minlength=len(edge_keys)).astype(np.int64)
+        edge_cards, edge_merchants = np.divmod(edge_keys, max(n_merchants, 1))
+
+        self.card_indptr = np.concatenate(([0], np.cumsum(np.bincount(edge_cards, minlength=n_cards))))
+        self.card_merchants = edge_merchants
+        self.card_txn_counts = edge_counts
+
+        by_merchant = np.argsort(edge_merchants, kind='stable')
+        self.merchant_indptr = np.concatenate(([0], np.cumsum(np.bincount(edge_merchants, minlength=n_merchants))))
+        self.merchant_cards = edge_cards[by_merchant]
+        self.merchant_txn_counts = edge_counts[by_merchant]
+
+        self._pending_by_card, self._pending_by_merchant = {}, {}
+        self._pending_edges = 0
+
+    def add_transactions(self, card_ids, merchant_ids):
+        """Adds new transactions to the index without rebuilding it."""
+        cards = _encode_ids(card_ids, self.card_codes, self.card_names)
+        merchants = _encode_ids(merchant_ids, self.merchant_codes, self.merchant_names)
+        for card, merchant in zip(cards.tolist(), merchants.tolist()):
+            by_card = self._pending_by_card.setdefault(card, {})
+            if merchant not in by_card:
+                self._pending_edges += 1
+            by_card[merchant] = by_card.get(merchant, 0) + 1
+            by_merchant = self._pending_by_merchant.setdefault(merchant, {})
+            by_merchant[card] = by_merchant.get(card, 0) + 1
+        if self._pending_edges >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """Folds pending edges into the CSR arrays."""
+        if not self._pending_by_card:
+            return
+        cards = [np.repeat(np.arange(len(self.card_indptr) - 1), np.diff(self.card_indptr))]
+        merchants, counts = [self.card_merchants], [self.card_txn_counts]
+        for card, by_card in self._pending_by_card.items():
+            cards.append(np.full(len(by_card), card, dtype=np.int64))
+            merchants.append(np.fromiter(by_card.keys(), dtype=np.int64, count=len(by_card)))
+            counts.append(np.fromiter(by_card.values(), dtype=np.int64, count=len(by_card)))
+        self._build(np.concatenate(cards), np.concatenate(merchants), np.concatenate(counts))
+
+    @staticmethod
+    def _gather(codes: np.ndarray, indptr: np.ndarray, neighbours: np.ndarray, txn_counts: np.ndarray, pending: dict) -> tuple:
+        """Returns deduplicated (owner, neighbour, txn_count) edge arrays for the given nodes."""
+        in_csr = codes[codes < len(indptr) - 1]
+        starts, ends = indptr[in_csr], indptr[in_csr + 1]
+        lengths = ends - starts
+        # Concatenated CSR slices without a Python loop: each slice's offset plus a running position
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        owners = [np.repeat(in_csr, lengths)]
+        nbrs, counts = [neighbours[positions]], [txn_counts[positions]]
+        for code in codes.tolist():
+            extra = pending.get(code)
+            if extra:
+                owners.append(np.full(len(extra), code, dtype=np.int64))
+                nbrs.append(np.fromiter(extra.keys(), dtype=np.int64, count=len(extra)))
+                counts.append(np.fromiter(extra.values(), dtype=np.int64, count=len(extra)))
+        owners, nbrs, counts = np.concatenate(owners), np.concatenate(nbrs), np.concatenate(counts)
+        if len(owners) > lengths.sum():
+            # Pending edges may repeat an edge already in the CSR arrays; merge their counts
+            edge_keys, inverse = np.unique(owners * (nbrs.max() + 1) + nbrs, return_inverse=True)
+            counts = np.bincount(inverse, weights=counts, minlength=len(edge_keys)).astype(np.int64)
+            owners, nbrs = np.divmod(edge_keys, nbrs.max() + 1)
+        return owners, nbrs, counts
+
+    def cards_of_merchants(self, merchant_codes: np.ndarray) -> tuple:
+        return self._gather(merchant_codes, self.merchant_indptr, self.merchant_cards, self.merchant_txn_counts, self._pending_by_merchant)
+
+    def merchants_of_cards(self, card_codes: np.ndarray) -> tuple:
+        return self._gather(card_codes, self.card_indptr, self.card_merchants, self.card_txn_counts, self._pending_by_card)
+
+    def shared_card_counts(self, merchant_code: int) -> tuple:
+        """Per-merchant number of cards shared with merchant_code and the transactions on those cards."""
+        _, cards, _ = self.cards_of_merchants(np.array([merchant_code], dtype=np.int64))
+        _, merchants, txn_counts = self.merchants_of_cards(np.unique(cards))
+        n_merchants = len(self.merchant_names)
+        shared_cards = np.bincount(merchants, minlength=n_merchants)
+        shared_txns = np.bincount(merchants, weights=txn_counts, minlength=n_merchants).astype(np.int64)
+        shared_cards[merchant_code] = 0
+        shared_txns[merchant_code] = 0
+        return shared_cards, shared_txns, len(cards)
+
+
+class AmountDistributionSketch:
+    """Streaming per-group amount distributions (e.g. per MCC or per merchant).
+
+    Each group keeps a log-bucketed histogram (DDSketch-style: bucket bounds grow by a constant
+    factor, so quantiles are within relative_accuracy of the true value) plus running count, sum
+    and sum of squares for z-scores. Adding transactions only touches the batch's (group, bucket)
+    cells, so the sketches update incrementally and never need the raw amounts again.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 0.01, max_value: float = 1e7):
+        self.min_value, self.max_value = min_value, max_value
+        gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = np.log(gamma)
+        self.bucket_offset = int(np.ceil(np.log(min_value) / self.log_gamma))
+        self.n_buckets = int(np.ceil(np.log(max_value) / self.log_gamma)) - self.bucket_offset + 1
+        # Representative value of each bucket: the midpoint (in relative terms) of its bounds
+        self.bucket_values = 2 * gamma ** (np.arange(self.n_buckets) + self.bucket_offset) / (gamma + 1)
+        self.group_codes, self.group_names = {}, []
+        self.bucket_counts = np.zeros((0, self.n_buckets), dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.sums = np.zeros(0)
+        self.sums_sq = np.zeros(0)
+
+    def buckets(self, values) -> np.ndarray:
+        """Bucket index of each amount; raises ValueError for non-finite amounts."""
+        values = np.asarray(values, dtype=float)
+        if not np.isfinite(values).all():
+            raise ValueError("Amounts must be finite numbers.")
+        clipped = np.clip(values, self.min_value, self.max_value)
+        return np.ceil(np.log(clipped) / self.log_gamma).astype(np.int64) - self.bucket_offset
+
+    def _ensure_capacity(self, n_groups: int):
+        # Grow geometrically so registering new groups stays amortised O(1)
+        capacity = len(self.counts)
+        if n_groups <= capacity:
+            return
+        grow = max(n_groups, 2 * capacity) - capacity
+        self.bucket_counts = np.vstack((self.bucket_counts, np.zeros((grow, self.n_buckets), dtype=np.int64)))
+        self.counts = np.concatenate((self.counts, np.zeros(grow, dtype=np.int64)))
+        self.sums = np.concatenate((self.sums, np.zeros(grow)))
+        self.sums_sq = np.concatenate((self.sums_sq, np.zeros(grow)))
+
+    def add(self, groups, values):
+        """Adds amounts to their groups' sketches. Values are validated before anything changes."""
+        values = np.asarray(values, dtype=float)
+        buckets = self.buckets(values)
+        codes = _encode_ids(groups, self.group_codes, self.group_names)
+        self._ensure_capacity(len(self.group_names))
+        np.add.at(self.bucket_counts, (codes, buckets), 1)
+        np.add.at(self.counts, codes, 1)
+        np.add.at(self.sums, codes, values)
+        np.add.at(self.sums_sq, codes, values ** 2)
+
+    def mean_std(self, code: int) -> tuple:
+        count = max(self.counts[code], 1)
+        mean = self.sums[code] / count
+        return mean, np.sqrt(max(self.sums_sq[code] / count - mean ** 2, 0.0))
+
+    def percentile_rank(self, code: int, values: np.ndarray) -> np.ndarray:
+        """Approximate share (0-100) of the group's amounts below the given values (mid-rank within a bucket)."""
+        group_counts = self.bucket_counts[code]
+        buckets = self.buckets(values)
+        below_or_equal = np.cumsum(group_counts)[buckets]
+        return 100.0 * (below_or_equal - group_counts[buckets] / 2.0) / max(self.counts[code], 1)
+
+    def quantiles(self, code: int, qs) -> list:
+        """Approximate amount quantiles (0-1) for one group."""
+        if self.counts[code] == 0:
+            return [None] * len(qs)
+        ranks = np.asarray(qs, dtype=float) * (self.counts[code] - 1)
+        buckets = np.searchsorted(np.cumsum(self.bucket_counts[code]), ranks, side='right')
+        return np.round(self.bucket_values[buckets], 2).tolist()
+
+
+def _add_to_amount_sketches(txns: pd.DataFrame):
+    """Feeds transaction amounts into the per-MCC and per-merchant sketches."""
+    # Both sketches bucket the same amounts, so validating once up front keeps them in step
+    mcc_amount_sketch.buckets(txns['amount'])
+    merchant_amount_sketch.add(txns['merchant_id'], txns['amount'])
+    mccs = txns['merchant_id'].map(merchant_mccs)
+    known = mccs.notna()
+    mcc_amount_sketch.add(mccs[known].astype(int), txns.loc[known, 'amount'])
+
 # --- Load Data ---
 # Best practice: Load once at startup
 DATA_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -14,12 +237,42 @@ try:
     transactions_df = pd.read_csv(os.path.join(DATA_DIR, 'synthetic_transactions.csv'))
     # Convert timestamp column to datetime objects if it's not already
     transactions_df['timestamp'] = pd.to_datetime(transactions_df['timestamp'])
+    # Running per-merchant counts and active span, so baselines update per batch on ingest
+    merchant_activity = _summarize_merchant_activity(transactions_df)
+    card_merchant_index = CardMerchantIndex(transactions_df['card_id_token'], transactions_df['merchant_id'])
+    merchant_mccs = merchants_df.set_index('merchant_id')['mcc']
+    mcc_amount_sketch, merchant_amount_sketch = AmountDistributionSketch(), AmountDistributionSketch()
+    _add_to_amount_sketches(transactions_df)
     print("Data loaded successfully.")
 except FileNotFoundError:
     print("Error: synthetic_merchants.csv or synthetic_transactions.csv not found.")
     # In a real app, handle this more gracefully
     merchants_df = pd.DataFrame()
     transactions_df = pd.DataFrame()
+    merchant_activity = pd.DataFrame({'txn_count': pd.Series(dtype=np.int64), 'first_seen': pd.Series(dtype='datetime64[ns]'), 'last_seen': pd.Series(dtype='datetime64[ns]')})
+    card_merchant_index = CardMerchantIndex([], [])
+    merchant_mccs = pd.Series(dtype=int)
+    mcc_amount_sketch, merchant_amount_sketch = AmountDistributionSketch(), AmountDistributionSketch()
+
+# Transactions received through /transactions that are not yet concatenated into transactions_df
+pending_txn_batches = []
+# Flask serves requests on threads; ingest and every reader of the shared stores
+# (transactions_df, the card index, the sketches) run under this lock
+data_lock = threading.RLock()
+
+
+def _holding_data_lock(func):
+    """Runs a tool while holding data_lock so it never sees a half-applied ingest or index compaction."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with data_lock:
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _json_safe_records(txns: pd.DataFrame) -> list:
+    """Converts rows to dicts with missing values as None (bare NaN is not valid JSON)."""
+    return txns.astype(object).where(txns.notna(), None).to_dict('records')
 
 # --- Tool Implementations ---
 # These functions are the actual tools the MCP server provides.
@@ -35,8 +288,10 @@ def get_merchant_profile(merchant_id: str) -> dict:
     # Convert to dictionary, handle potential multiple matches if ID isn't unique
     return profile.iloc[0].to_dict()
 
+@_holding_data_lock
 def get_merchant_aggregated_stats(merchant_id: str, start_date_str: str, end_date_str: str) -> dict:
     """Calculates aggregated transaction statistics for a merchant within a date range."""
+    _flush_ingested_transactions()
     if transactions_df.empty:
         return {"error": "Transaction data not loaded"}
     try:
@@ -68,24 +323,280 @@ def get_merchant_aggregated_stats(merchant_id: str, start_date_str: str, end_dat
     }
     return stats
 
-def get_anomalous_transactions(merchant_id: str, start_date_str: str, end_date_str: str, min_amount: float = 1000.0) -> list:
-    """Retrieves examples of potentially anomalous transactions (e.g., high value)."""
+@_holding_data_lock
+def get_anomalous_transactions(merchant_id: str, start_date_str: str, end_date_str: str, min_amount: float = 1000.0, mode: str = "threshold", top_k: int = 10) -> list:
+    """Retrieves examples of potentially anomalous transactions.
+
+    mode="threshold" returns transactions at or above min_amount. mode="zscore" or "percentile"
+    returns the top_k most extreme transactions relative to the merchant's MCC amount baseline
+    (high or low), with z-score and percentile against both the MCC and the merchant itself,
+    plus the MCC's median and 99th-percentile amounts for context.
+    """
+    _flush_ingested_transactions()
     if transactions_df.empty:
         return [{"error": "Transaction data not loaded"}]
+    if mode not in ("threshold", "zscore", "percentile"):
+        return [{"error": f"Unknown mode '{mode}'. Use 'threshold', 'zscore' or 'percentile'."}]
+    if top_k < 1:
+        return [{"error": "top_k must be at least 1."}]
     try:
         start_date = datetime.fromisoformat(start_date_str)
         end_date = datetime.fromisoformat(end_date_str)
     except ValueError:
         return [{"error": "Invalid date format. Use ISO format (YYYY-MM-DDTHH:MM:SS)."}]
 
-    anomalous_txns = transactions_df[
+    if mode == "threshold":
+        anomalous_txns = transactions_df[
+            (transactions_df['merchant_id'] == merchant_id) &
+            (transactions_df['timestamp'] >= start_date) &
+            (transactions_df['timestamp'] <= end_date) &
+            (transactions_df['amount'] >= min_amount) # Example anomaly: high value
+        ]
+        # Return a limited number of examples
+        return _json_safe_records(anomalous_txns.head(10))
+
+    merchant_txns = transactions_df[
         (transactions_df['merchant_id'] == merchant_id) &
         (transactions_df['timestamp'] >= start_date) &
-        (transactions_df['timestamp'] <= end_date) &
-        (transactions_df['amount'] >= min_amount) # Example anomaly: high value
+        (transactions_df['timestamp'] <= end_date)
     ]
-    # Return a limited number of examples
-    return anomalous_txns.head(10).to_dict('records')
+    if merchant_txns.empty:
+        return []
+    mcc = merchant_mccs.get(merchant_id)
+    mcc_code = mcc_amount_sketch.group_codes.get(int(mcc)) if pd.notna(mcc) else None
+    if mcc_code is None:
+        return [{"error": f"No MCC baseline available for merchant {merchant_id}."}]
+    merchant_code = merchant_amount_sketch.group_codes.get(merchant_id)
+    if merchant_code is None:
+        return [{"error": f"No amount baseline available for merchant {merchant_id}."}]
+
+    amounts = merchant_txns['amount'].to_numpy(dtype=float)
+    mcc_mean, mcc_std = mcc_amount_sketch.mean_std(mcc_code)
+    mcc_z = (amounts - mcc_mean) / max(mcc_std, 1e-9)
+    mcc_pct = mcc_amount_sketch.percentile_rank(mcc_code, amounts)
+    mcc_p50, mcc_p99 = mcc_amount_sketch.quantiles(mcc_code, [0.5, 0.99])
+    merchant_mean, merchant_std = merchant_amount_sketch.mean_std(merchant_code)
+    merchant_z = (amounts - merchant_mean) / max(merchant_std, 1e-9)
+    merchant_pct = merchant_amount_sketch.percentile_rank(merchant_code, amounts)
+
+    # Extremeness in either tail; top-k selection avoids sorting every transaction
+    extremeness = np.abs(mcc_z) if mode == "zscore" else np.abs(mcc_pct - 50.0)
+    k = min(top_k, len(amounts))
+    top = np.argpartition(-extremeness, k - 1)[:k]
+    top = top[np.argsort(-extremeness[top], kind='stable')]
+
+    records = _json_safe_records(merchant_txns.iloc[top])
+    for record, i in zip(records, top.tolist()):
+        record.update({
+            "mcc": int(mcc),
+            "mcc_p50_amount": mcc_p50,
+            "mcc_p99_amount": mcc_p99,
+            "mcc_zscore": round(float(mcc_z[i]), 2),
+            "mcc_percentile": round(float(mcc_pct[i]), 2),
+            "merchant_zscore": round(float(merchant_z[i]), 2),
+            "merchant_percentile": round(float(merchant_pct[i]), 2),
+        })
+    return records
+
+
+def _rolling_window_stats(keys: pd.Series, timestamps: pd.Series, amounts: np.ndarray, near_flags: np.ndarray, window_seconds: int) -> tuple:
+    """Trailing time-window count, sum and near-threshold count for every transaction.
+
+    Each row's window covers the transactions with the same key in (timestamp - window, timestamp].
+    Rows are sorted once by (key, time) and all window starts come from one vectorized search
+    plus cumulative sums, instead of rescanning the data per key.
+    """
+    key_codes, _ = pd.factorize(keys)
+    seconds = ((timestamps - timestamps.min()) // pd.Timedelta(seconds=1)).to_numpy(dtype=np.int64)
+    # Pack (key, second) into a single sortable int64; 32 bits of seconds covers ~136 years,
+    # which holds as long as the window (bounded by MAX_WINDOW_MINUTES) stays far below that
+    packed = key_codes.astype(np.int64) * (1 << 32) + seconds
+    order = np.argsort(packed, kind='stable')
+    packed = packed[order]
+    window_start = np.searchsorted(packed, packed - window_seconds, side='right')
+    idx = np.arange(len(packed))
+
+    amount_cumsum = np.concatenate(([0.0], np.cumsum(amounts[order])))
+    near_cumsum = np.concatenate(([0], np.cumsum(near_flags[order])))
+
+    counts = np.empty(len(packed), dtype=np.int64)
+    sums = np.empty(len(packed), dtype=float)
+    near_counts = np.empty(len(packed), dtype=np.int64)
+    counts[order] = idx - window_start + 1
+    sums[order] = amount_cumsum[idx + 1] - amount_cumsum[window_start]
+    near_counts[order] = near_cumsum[idx + 1] - near_cumsum[window_start]
+    return counts, sums, near_counts
+
+
+def _summarize_windows(txns: pd.DataFrame, key: str) -> pd.DataFrame:
+    """Collapses per-transaction window stats to one row per key, keeping each key's peak window."""
+    grouped = txns.groupby(key, sort=False)
+    peak_rows = txns.loc[grouped['window_count'].idxmax()].set_index(key)
+    return pd.DataFrame({
+        "transactions": grouped.size(),
+        "peak_window_count": peak_rows['window_count'],
+        "peak_window_end": peak_rows['timestamp'],
+        "peak_window_value": grouped['window_sum'].max(),
+        "max_near_threshold_in_window": grouped['window_near_count'].max(),
+    })
+
+
+# Longest rolling window accepted (one year); also keeps window offsets well inside the packed key range
+MAX_WINDOW_MINUTES = 60 * 24 * 365
+
+
+@_holding_data_lock
+def get_velocity_and_structuring_summary(start_date_str: str, end_date_str: str, merchant_id: str = None, window_minutes: int = 60, reporting_threshold: float = 1000.0, near_threshold_pct: float = 10.0, min_burst_count: int = 3, top_n: int = 10) -> dict:
+    """Detects velocity spikes and structuring bursts using rolling time windows per merchant and per card.
+
+    Without merchant_id the whole portfolio is scanned and the top merchants/cards are returned.
+    A structuring burst is min_burst_count or more transactions falling within near_threshold_pct
+    percent below reporting_threshold inside one window. Merchant velocity is compared with the
+    merchant's own baseline (average transactions per window over the merchant's active span;
+    null when the merchant has too little history to measure one).
+    """
+    _flush_ingested_transactions()
+    if transactions_df.empty:
+        return {"error": "Transaction data not loaded"}
+    try:
+        start_date = datetime.fromisoformat(start_date_str)
+        end_date = datetime.fromisoformat(end_date_str)
+    except ValueError:
+        return {"error": "Invalid date format. Use ISO format (YYYY-MM-DDTHH:MM:SS)."}
+    if not (float(window_minutes).is_integer() and 1 <= window_minutes <= MAX_WINDOW_MINUTES):
+        return {"error": f"window_minutes must be a whole number between 1 and {MAX_WINDOW_MINUTES}."}
+    if not 0 < near_threshold_pct < 100:
+        return {"error": "near_threshold_pct must be between 0 and 100 (exclusive)."}
+    if min_burst_count < 1:
+        return {"error": "min_burst_count must be at least 1."}
+    if top_n < 1:
+        return {"error": "top_n must be at least 1."}
+
+    mask = (transactions_df['timestamp'] >= start_date) & (transactions_df['timestamp'] <= end_date)
+    if merchant_id:
+        mask &= transactions_df['merchant_id'] == merchant_id
+    txns = transactions_df.loc[mask, ['merchant_id', 'card_id_token', 'timestamp', 'amount']]
+    if txns.empty:
+        return {"message": f"No transactions found for {merchant_id or 'the portfolio'} in the period."}
+
+    window_seconds = int(window_minutes * 60)
+    near_floor = reporting_threshold * (1 - near_threshold_pct / 100.0)
+    amounts = txns['amount'].to_numpy(dtype=float)
+    near_flags = ((amounts >= near_floor) & (amounts < reporting_threshold)).astype(np.int64)
+
+    results = {
+        "period_start": start_date_str,
+        "period_end": end_date_str,
+        "window_minutes": window_minutes,
+        "near_threshold_range": [round(near_floor, 2), reporting_threshold],
+        "transactions_scanned": len(txns),
+    }
+    for key, label in (('merchant_id', 'merchants'), ('card_id_token', 'cards')):
+        counts, sums, near_counts = _rolling_window_stats(txns[key], txns['timestamp'], amounts, near_flags, window_seconds)
+        windowed = txns.assign(window_count=counts, window_sum=sums, window_near_count=near_counts)
+        summary = _summarize_windows(windowed, key)
+        summary['structuring_burst'] = summary['max_near_threshold_in_window'] >= min_burst_count
+
+        if key == 'merchant_id':
+            baseline = _merchant_txn_rates().reindex(summary.index) * window_seconds
+            summary['baseline_window_count'] = baseline.round(2)
+            # Floor the baseline at one transaction so quiet merchants don't produce huge ratios
+            summary['velocity_ratio'] = (summary['peak_window_count'] / baseline.clip(lower=1.0)).round(2)
+            summary = summary.sort_values(['structuring_burst', 'velocity_ratio'], ascending=False)
+        else:
+            summary = summary.sort_values(['structuring_burst', 'peak_window_count'], ascending=False)
+
+        results[f"{label}_with_structuring_bursts"] = int(summary['structuring_burst'].sum())
+        top = summary.head(top_n).reset_index()
+        top['peak_window_end'] = top['peak_window_end'].dt.strftime('%Y-%m-%dT%H:%M:%S')
+        top['peak_window_value'] = top['peak_window_value'].round(2)
+        results[f"top_{label}"] = json.loads(top.to_json(orient='records'))
+    return results
+
+
+@_holding_data_lock
+def get_merchants_sharing_cards(merchant_id: str, top_n: int = 10) -> dict:
+    """Finds the merchants that share the most card_id_tokens with a merchant (transaction laundering signal)."""
+    if top_n < 1:
+        return {"error": "top_n must be at least 1."}
+    merchant_code = card_merchant_index.merchant_codes.get(merchant_id)
+    if merchant_code is None:
+        return {"message": f"No card activity found for {merchant_id}."}
+
+    shared_cards, shared_txns, total_cards = card_merchant_index.shared_card_counts(merchant_code)
+    candidates = np.flatnonzero(shared_cards)
+    # Top-k by shared cards without sorting the whole portfolio
+    if len(candidates) > top_n:
+        candidates = candidates[np.argpartition(-shared_cards[candidates], top_n - 1)[:top_n]]
+    candidates = candidates[np.lexsort((-shared_txns[candidates], -shared_cards[candidates]))]
+
+    owners, _, _ = card_merchant_index.cards_of_merchants(candidates)
+    card_totals = np.bincount(owners, minlength=len(card_merchant_index.merchant_names))
+    merchants = []
+    for code in candidates.tolist():
+        union = total_cards + card_totals[code] - shared_cards[code]
+        merchants.append({
+            "merchant_id": card_merchant_index.merchant_names[code],
+            "shared_cards": int(shared_cards[code]),
+            "transactions_on_shared_cards": int(shared_txns[code]),
+            "card_overlap_jaccard": round(float(shared_cards[code] / union), 4),
+        })
+    return {
+        "merchant_id": merchant_id,
+        "unique_cards": total_cards,
+        "merchants_sharing_cards": int(np.count_nonzero(shared_cards)),
+        "top_sharing_merchants": merchants,
+    }
+
+
+@_holding_data_lock
+def get_shared_card_cluster(merchant_id: str, max_hops: int = 2, min_shared_cards: int = 2, max_merchants: int = 25) -> dict:
+    """Expands the cluster of merchants connected to a merchant through shared cards (possible laundering ring).
+
+    Two merchants are linked when they share at least min_shared_cards cards. The cluster is
+    explored breadth-first up to max_hops away and stops as soon as it reaches max_merchants
+    members (reported as truncated).
+    """
+    for name, value in (("max_hops", max_hops), ("min_shared_cards", min_shared_cards), ("max_merchants", max_merchants)):
+        if value < 1:
+            return {"error": f"{name} must be at least 1."}
+    seed_code = card_merchant_index.merchant_codes.get(merchant_id)
+    if seed_code is None:
+        return {"message": f"No card activity found for {merchant_id}."}
+
+    members = {seed_code: {"hop": 0, "linked_via": None, "shared_cards": None}}
+    frontier = [seed_code]
+    truncated = False
+    for hop in range(1, max_hops + 1):
+        next_frontier = []
+        for code in frontier:
+            shared_cards, _, _ = card_merchant_index.shared_card_counts(code)
+            linked = np.flatnonzero(shared_cards >= min_shared_cards)
+            # Strongest links first so the cap keeps the most connected merchants
+            for neighbour in linked[np.argsort(-shared_cards[linked], kind='stable')].tolist():
+                if neighbour in members:
+                    continue
+                members[neighbour] = {"hop": hop, "linked_via": card_merchant_index.merchant_names[code], "shared_cards": int(shared_cards[neighbour])}
+                next_frontier.append(neighbour)
+                if len(members) >= max_merchants:
+                    truncated = True
+                    break
+            if truncated:
+                break
+        frontier = next_frontier
+        if truncated or not frontier:
+            break
+
+    return {
+        "merchant_id": merchant_id,
+        "min_shared_cards": min_shared_cards,
+        "cluster_size": len(members),
+        "truncated": truncated,
+        "members": [
+            {"merchant_id": card_merchant_index.merchant_names[code], **info}
+            for code, info in members.items()
+        ],
+    }
 
 
 def update_merchant_risk_status(merchant_id: str, new_status: str, reason_code: str) -> dict:
@@ -113,11 +624,88 @@ def create_aml_manual_review_case(merchant_id: str, risk_category: str, summary:
     case_id = f"CASE_{pd.Timestamp.now().strftime('%Y%m%d%H%M%S')}_{merchant_id}"
     return {"status": "success", "case_id": case_id, "merchant_id": merchant_id}
 
+
+def _flush_ingested_transactions():
+    """Folds batches ingested since the last query into transactions_df with a single concat."""
+    global transactions_df
+    with data_lock:
+        # Detach the queue before concatenating so no batch can be appended and then cleared unseen
+        batches, pending_txn_batches[:] = pending_txn_batches[:], []
+        if batches:
+            transactions_df = pd.concat([transactions_df, *batches], ignore_index=True)
+
+
+# Typed defaults for the optional transaction columns, so ingested rows never carry NaN
+OPTIONAL_TXN_DEFAULTS = {
+    'currency': 'USD',
+    'card_type': 'Unknown',
+    'card_country': 'Unknown',
+    'is_rounded': False,
+    'is_error': 0,
+}
+
+
+@_holding_data_lock
+def ingest_transactions(transactions: list) -> dict:
+    """Validates newly arrived transactions, then updates the load-time indexes incrementally.
+
+    Work is proportional to the batch: rows are queued and only concatenated into transactions_df
+    the next time a tool reads it.
+    """
+    global merchant_activity
+    required = ['merchant_id', 'card_id_token', 'timestamp', 'amount']
+    if not isinstance(transactions, list) or not transactions or not all(isinstance(t, dict) for t in transactions):
+        return {"status": "error", "message": "Expected a non-empty list of transaction records."}
+    new_txns = pd.DataFrame(transactions)
+    missing = set(required) - set(new_txns.columns)
+    if missing:
+        return {"status": "error", "message": f"Transactions must include merchant_id, card_id_token, timestamp and amount (missing: {sorted(missing)})."}
+    empty_fields = [col for col in required if new_txns[col].isna().any()]
+    if empty_fields:
+        return {"status": "error", "message": f"Transactions have empty values in: {empty_fields}."}
+    # Check raw values: pandas would read numbers as epoch timestamps and booleans as 0/1 amounts
+    if not all(isinstance(t['timestamp'], str) for t in transactions):
+        return {"status": "error", "message": "timestamp must be an ISO format string (YYYY-MM-DDTHH:MM:SS)."}
+    if any(isinstance(t['amount'], bool) or not isinstance(t['amount'], (int, float, str)) for t in transactions):
+        return {"status": "error", "message": "amount must be numeric."}
+    try:
+        amounts = pd.to_numeric(new_txns['amount'], errors='raise').astype(float)
+    except (ValueError, TypeError):
+        return {"status": "error", "message": "amount must be numeric."}
+    if not np.isfinite(amounts).all():
+        return {"status": "error", "message": "amount must be a finite number."}
+    try:
+        timestamps = pd.to_datetime(new_txns['timestamp'])
+    except (ValueError, TypeError):
+        return {"status": "error", "message": "Invalid timestamp format. Use ISO format (YYYY-MM-DDTHH:MM:SS) with one consistent timezone."}
+    if timestamps.dt.tz is not None:
+        # Stored timestamps are naive; normalise offset-aware input to naive UTC
+        timestamps = timestamps.dt.tz_convert(None)
+    new_txns = new_txns.assign(amount=amounts, timestamp=timestamps)
+    for col, default in OPTIONAL_TXN_DEFAULTS.items():
+        new_txns[col] = new_txns[col].fillna(default) if col in new_txns else default
+
+    # Input is valid from here on; the sketches go first since they are the only store with
+    # its own validation, so a rejected batch leaves every store untouched
+    try:
+        _add_to_amount_sketches(new_txns)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    card_merchant_index.add_transactions(new_txns['card_id_token'], new_txns['merchant_id'])
+    merchant_activity = pd.concat([merchant_activity, _summarize_merchant_activity(new_txns)]).groupby(level=0).agg(
+        {'txn_count': 'sum', 'first_seen': 'min', 'last_seen': 'max'})
+    pending_txn_batches.append(new_txns)
+    total = len(transactions_df) + sum(len(batch) for batch in pending_txn_batches)
+    return {"status": "success", "ingested": len(new_txns), "total_transactions": total}
+
 # --- Mapping Tool Names to Functions ---
 AVAILABLE_TOOLS = {
     "get_merchant_profile": get_merchant_profile,
     "get_merchant_aggregated_stats": get_merchant_aggregated_stats,
     "get_anomalous_transactions": get_anomalous_transactions,
+    "get_velocity_and_structuring_summary": get_velocity_and_structuring_summary,
+    "get_merchants_sharing_cards": get_merchants_sharing_cards,
+    "get_shared_card_cluster": get_shared_card_cluster,
     "update_merchant_risk_status": update_merchant_risk_status,
     "create_aml_manual_review_case": create_aml_manual_review_case,
 }
@@ -169,6 +757,12 @@ def execute_tool():
         traceback.print_exc()
         return jsonify({"error": f"Internal server error executing tool '{tool_name}': {str(e)}"}), 500
 
+@app.route('/transactions', methods=['POST'])
+def post_transactions():
+    """Data feed endpoint: accepts a JSON list of new transactions and indexes them."""
+    result = ingest_transactions(request.get_json() or [])
+    return jsonify(result), (200 if result["status"] == "success" else 400)
+
 # --- Run the Server ---
 if __name__ == '__main__':
     # Makes the server accessible on your local network
@@ -55,7 +55,7 @@ tools_definition = [
         "type": "function",
         "function": {
             "name": "get_anomalous_transactions",
-            "description": "Retrieves examples of potentially anomalous transactions (e.g., high value) for a merchant within a date range.",
+            "description": "Retrieves examples of potentially anomalous transactions for a merchant within a date range: either high-value transactions above min_amount, or the most extreme transactions by z-score or percentile relative to the merchant's MCC amount baseline.",
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -63,11 +63,66 @@ tools_definition = [
                     "start_date_str": {"type": "string", "description": "The start date/time in ISO format (YYYY-MM-DDTHH:MM:SS)."},
                     "end_date_str": {"type": "string", "description": "The end date/time in ISO format (YYYY-MM-DDTHH:MM:SS)."},
                     "min_amount": {"type": "number", "description": "Optional minimum transaction amount to consider anomalous (default 1000.0)."},
+                    "mode": {"type": "string", "enum": ["threshold", "zscore", "percentile"], "description": "Optional selection mode: 'threshold' uses min_amount (default); 'zscore' or 'percentile' rank transactions against the MCC baseline."},
+                    "top_k": {"type": "integer", "description": "Optional number of transactions to return in 'zscore'/'percentile' mode (default 10)."},
                 },
                 "required": ["merchant_id", "start_date_str", "end_date_str"],
             },
         },
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_velocity_and_structuring_summary",
+            "description": "Computes rolling-window transaction counts and values per merchant and per card, flags bursts of just-below-threshold amounts (structuring) and compares each merchant's peak window with its own baseline. Omit merchant_id to scan the whole portfolio.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "start_date_str": {"type": "string", "description": "The start date/time in ISO format (YYYY-MM-DDTHH:MM:SS)."},
+                    "end_date_str": {"type": "string", "description": "The end date/time in ISO format (YYYY-MM-DDTHH:MM:SS)."},
+                    "merchant_id": {"type": "string", "description": "Optional merchant ID to restrict the scan to (default: whole portfolio)."},
+                    "window_minutes": {"type": "integer", "description": "Optional rolling window length in minutes (default 60)."},
+                    "reporting_threshold": {"type": "number", "description": "Optional reporting threshold that structured amounts stay just below (default 1000.0)."},
+                    "near_threshold_pct": {"type": "number", "description": "Optional percentage below the threshold that counts as 'just below' (default 10.0)."},
+                    "min_burst_count": {"type": "integer", "description": "Optional number of near-threshold transactions in one window that counts as a burst (default 3)."},
+                    "top_n": {"type": "integer", "description": "Optional number of merchants and cards to return (default 10)."},
+                },
+                "required": ["start_date_str", "end_date_str"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_merchants_sharing_cards",
+            "description": "Finds the merchants that share the most card tokens with a merchant, a key transaction laundering signal.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "merchant_id": {"type": "string", "description": "The unique ID of the merchant."},
+                    "top_n": {"type": "integer", "description": "Optional number of sharing merchants to return (default 10)."},
+                },
+                "required": ["merchant_id"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_shared_card_cluster",
+            "description": "Returns the cluster of merchants connected to a merchant through shared card tokens (possible laundering ring).",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "merchant_id": {"type": "string", "description": "The unique ID of the merchant at the centre of the cluster."},
+                    "max_hops": {"type": "integer", "description": "Optional number of hops to expand from the merchant (default 2)."},
+                    "min_shared_cards": {"type": "integer", "description": "Optional minimum shared cards for two merchants to be linked (default 2)."},
+                    "max_merchants": {"type": "integer", "description": "Optional cap on cluster size (default 25)."},
+                },
+                "required": ["merchant_id"],
+            },
+        },
+    },
     {
         "type": "function",
         "function": {
@@ -137,7 +192,9 @@ instructions = {
 Use the provided tools to fetch:
 1. The merchant's profile.
 2. Aggregated transaction statistics (total volume, value, avg value, card types, countries, rounded values).
-3. Examples of anomalous transactions (e.g., high value).
+3. Examples of anomalous transactions (e.g., high value, and the most extreme amounts relative to the MCC baseline using mode 'zscore').
+4. Velocity and structuring summary (rolling-window spikes vs. baseline, just-below-threshold bursts).
+5. Merchants sharing cards with this merchant and the shared-card cluster around it.
 Present this information clearly and concisely for the next agent. Use ISO format (YYYY-MM-DDTHH:MM:SS) for dates.""",
 
     "Pattern Detection": """Analyze the provided aggregated data, anomalous transaction examples, and profile information for the merchant.
@@ -146,8 +203,9 @@ Identify patterns potentially indicative of Money/Transaction Laundering based o
 - High percentage of rounded transaction values
 - Significant activity from high-risk jurisdictions (check profile and card countries)
 - Transaction values inconsistent with the merchant category code (MCC) profile
-- Structuring patterns (if suggested by transaction examples or velocity)
-- Sudden changes in activity volume/value (compare stats over time if possible - requires history not implemented here)
+- Structuring patterns (bursts of just-below-threshold amounts in the velocity summary)
+- Sudden changes in activity volume/value (peak rolling-window activity vs. the merchant's baseline)
+- Cards shared with many other merchants or membership in a tightly linked shared-card cluster
 - Ownership changes noted in profile combined with other risks.
 List the specific patterns detected.""",
 